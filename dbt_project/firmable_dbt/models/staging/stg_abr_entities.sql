@@ -1,4 +1,10 @@
-{{ config(materialized='table') }}
+{{ config(
+    materialized='table',
+    post_hook=(
+        ["CREATE INDEX ON {{ this }} USING gist (entity_name_norm gist_trgm_ops)"]
+        if var('abr_trgm_index', false) else []
+    )
+) }}
 
 WITH raw AS (
     SELECT
@@ -1,3 +1,9 @@
+-- EXTENSIONS
+
+-- Trigram similarity / KNN search for ABR name candidate lookup
+CREATE EXTENSION IF NOT EXISTS pg_trgm;
+
+
 -- RAW TABLES
 
 CREATE TABLE IF NOT EXISTS raw_commoncrawl (
@@ -0,0 +1,63 @@
+"""
+Shared helper for streaming rows into PostgreSQL with cur.copy_expert.
+"""
+import csv
+import io
+from itertools import islice
+from typing import Iterable
+
+COPY_NULL = "\\N"
+
+
+class CsvRowStream(io.TextIOBase):
+    """
+    Read-only text stream that CSV-encodes rows from an iterator on demand,
+    so cur.copy_expert can pull an arbitrarily long row stream without it
+    ever being materialised. None is written as \\N (COPY_NULL; use
+    NULL '\\N' in the COPY options), keeping empty strings distinct from
+    NULLs.
+    """
+
+    def __init__(self, rows: Iterable[tuple], rows_per_chunk: int = 1000):
+        self._rows = iter(rows)
+        self._rows_per_chunk = rows_per_chunk
+        self._buf = io.StringIO()
+        self._writer = csv.writer(self._buf)
+        self._pending = ""
+        self._pos = 0
+        self.rows_written = 0
+
+    def readable(self) -> bool:
+        return True
+
+    def _encode_chunk(self) -> str:
+        for row in islice(self._rows, self._rows_per_chunk):
+            self._writer.writerow([COPY_NULL if v is None else v for v in row])
+            self.rows_written += 1
+        chunk = self._buf.getvalue()
+        self._buf.seek(0)
+        self._buf.truncate(0)
+        return chunk
+
+    def read(self, size: int = -1) -> str:
+        if size < 0:
+            parts = [self._pending[self._pos:]]
+            chunk = self._encode_chunk()
+            while chunk:
+                parts.append(chunk)
+                chunk = self._encode_chunk()
+            self._pending, self._pos = "", 0
+            return "".join(parts)
+
+        # Hand out slices at a read cursor; only the unread tail is copied
+        # when the next chunk is appended
+        while len(self._pending) - self._pos < size:
+            chunk = self._encode_chunk()
+            if not chunk:
+                break
+            self._pending = self._pending[self._pos:] + chunk
+            self._pos = 0
+
+        out = self._pending[self._pos:self._pos + size]
+        self._pos += len(out)
+        return out
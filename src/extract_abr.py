@@ -1,37 +1,64 @@
+import os
 import xml.etree.ElementTree as ET
 from pathlib import Path
-from typing import List, Dict
+from typing import Dict, Iterable, Iterator
 
 import psycopg2
-from psycopg2.extras import execute_values
+
+from copy_stream import COPY_NULL, CsvRowStream
 
 
 DB_CONFIG = {
     "dbname": "firmable_companies",
     "user": "firmable",
     "password": "firmable_password",
-    "host": "localhost",
+    "host": os.getenv("PGHOST", "localhost"),
     "port": 5432,
 }
 
+RAW_ABR_COLUMNS = (
+    "abn",
+    "entity_name",
+    "entity_type",
+    "entity_status",
+    "address_line_1",
+    "address_line_2",
+    "suburb",
+    "postcode",
+    "state",
+    "country",
+    "start_date_raw",
+    "load_batch_id",
+)
+
+COPY_READ_SIZE = 64 * 1024
+
 
 def get_connection():
     return psycopg2.connect(**DB_CONFIG)
 
 
-def parse_abr_xml(xml_path: Path, load_batch_id: str) -> List[Dict]:
+def parse_abr_xml(xml_path: Path, load_batch_id: str) -> Iterator[Dict]:
     """
-    Parse an ABR-like XML file and return a list of row dicts
-    matching raw_abr columns.
+    Stream an ABR-like XML file and yield one row dict per record,
+    matching raw_abr columns. Each record is cleared and detached from its
+    parent once parsed, so memory stays flat regardless of file size.
     """
     print(f"📂 Parsing ABR XML: {xml_path}")
-    tree = ET.parse(xml_path)
-    root = tree.getroot()
 
-    rows = []
+    count = 0
+    # Open elements, so a finished record can be removed from its parent
+    # (clearing it alone would still leave one empty child per record)
+    open_elems = []
 
     # Adjust tag names/XPaths later for real ABR structure.
-    for rec in root.findall(".//ABRRecord"):
+    for event, rec in ET.iterparse(xml_path, events=("start", "end")):
+        if event == "start":
+            open_elems.append(rec)
+            continue
+        open_elems.pop()
+        if rec.tag != "ABRRecord":
+            continue
         abn = (rec.findtext("ABN") or "").strip()
         entity_name = (rec.findtext("EntityName") or "").strip()
         entity_type = (rec.findtext("EntityType") or "").strip()
@@ -47,57 +74,53 @@ def parse_abr_xml(xml_path: Path, load_batch_id: str) -> List[Dict]:
 
         start_date_raw = (rec.findtext("StartDate") or "").strip()
 
+        rec.clear()  # free memory
+        if open_elems:
+            open_elems[-1].remove(rec)
+
         if not abn or not entity_name:
             # Skip incomplete records; you can also log them.
             continue
 
-        rows.append(
-            {
-                "abn": abn,
-                "entity_name": entity_name,
-                "entity_type": entity_type,
-                "entity_status": entity_status,
-                "address_line_1": address_line_1,
-                "address_line_2": address_line_2,
-                "suburb": suburb,
-                "postcode": postcode,
-                "state": state,
-                "country": country,
-                "start_date_raw": start_date_raw,
-                "load_batch_id": load_batch_id,
-            }
-        )
-
-    print(f"✅ Parsed {len(rows)} ABR records from XML")
-    return rows
-
-
-def insert_rows(rows: List[Dict]):
-    if not rows:
-        print("⚠️ No rows to insert.")
-        return
+        count += 1
+        yield {
+            "abn": abn,
+            "entity_name": entity_name,
+            "entity_type": entity_type,
+            "entity_status": entity_status,
+            "address_line_1": address_line_1,
+            "address_line_2": address_line_2,
+            "suburb": suburb,
+            "postcode": postcode,
+            "state": state,
+            "country": country,
+            "start_date_raw": start_date_raw,
+            "load_batch_id": load_batch_id,
+        }
+
+    print(f"✅ Parsed {count} ABR records from XML")
+
+
+def insert_rows(rows: Iterable[Dict]):
+    """
+    Upsert a stream of raw_abr row dicts.
 
-    print(f"💾 Inserting {len(rows)} rows into raw_abr...")
+    Rows are streamed with COPY into a temp table, then merged into raw_abr
+    with one INSERT ... SELECT ... ON CONFLICT. Memory use is constant in the
+    number of rows.
+    """
+    print("💾 Inserting rows into raw_abr...")
     conn = get_connection()
-    conn.autocommit = True
+    conn.autocommit = False
     cur = conn.cursor()
 
-    insert_sql = """
-        INSERT INTO raw_abr (
-            abn,
-            entity_name,
-            entity_type,
-            entity_status,
-            address_line_1,
-            address_line_2,
-            suburb,
-            postcode,
-            state,
-            country,
-            start_date_raw,
-            load_batch_id
-        )
-        VALUES %s
+    columns = ", ".join(RAW_ABR_COLUMNS)
+
+    upsert_sql = f"""
+        INSERT INTO raw_abr ({columns})
+        SELECT DISTINCT ON (abn) {columns}
+        FROM raw_abr_load
+        ORDER BY abn, load_ord DESC
         ON CONFLICT (abn) DO UPDATE
         SET
             entity_name = EXCLUDED.entity_name,
@@ -113,28 +136,43 @@ def insert_rows(rows: List[Dict]):
             load_batch_id = EXCLUDED.load_batch_id
     """
 
-    values = [
-        (
-            r["abn"],
-            r["entity_name"],
-            r["entity_type"],
-            r["entity_status"],
-            r["address_line_1"],
-            r["address_line_2"],
-            r["suburb"],
-            r["postcode"],
-            r["state"],
-            r["country"],
-            r["start_date_raw"],
-            r["load_batch_id"],
+    try:
+        # Same column types as raw_abr, without its constraints/defaults
+        cur.execute(
+            f"CREATE TEMP TABLE raw_abr_load ON COMMIT DROP AS "
+            f"SELECT {columns} FROM raw_abr WITH NO DATA"
+        )
+        # Filled from its sequence in COPY order, so duplicates resolve to
+        # the last occurrence in the file
+        cur.execute("ALTER TABLE raw_abr_load ADD COLUMN load_ord bigserial")
+
+        stream = CsvRowStream(tuple(r[col] for col in RAW_ABR_COLUMNS) for r in rows)
+        cur.copy_expert(
+            f"COPY raw_abr_load ({columns}) FROM STDIN WITH (FORMAT CSV, NULL '{COPY_NULL}')",
+            stream,
+            size=COPY_READ_SIZE,
         )
-        for r in rows
-    ]
+        total = stream.rows_written
 
-    execute_values(cur, insert_sql, values)
-    cur.close()
-    conn.close()
-    print("✅ Insert completed.")
+        if total:
+            # DISTINCT ON: one statement can't upsert the same abn twice;
+            # the latest row for each abn wins
+            cur.execute(upsert_sql)
+
+        conn.commit()
+
+    except Exception as e:
+        conn.rollback()
+        print(f"❌ Error during raw_abr insert: {e}")
+        raise
+    finally:
+        cur.close()
+        conn.close()
+
+    if not total:
+        print("⚠️ No rows to insert.")
+        return
+    print(f"✅ Insert completed. Total rows: {total}")
 
 
 def main():
@@ -1,34 +1,52 @@
 from __future__ import annotations
 
+import csv
+import io
+import os
 import zipfile
 from pathlib import Path
 from typing import Dict, List
 
 import psycopg2
-from psycopg2.extras import execute_values
-from xml.etree.ElementTree import iterparse
+from lxml import etree
 
 DB_CONFIG = {
     "dbname": "firmable_companies",
     "user": "firmable",
     "password": "firmable_password",
-    "host": "localhost",
+    "host": os.getenv("PGHOST", "localhost"),
     "port": 5432,
 }
 
 DATA_DIR = Path(__file__).resolve().parent.parent / "data" / "abr"
-BATCH_SIZE = 5000
+COPY_BUFFER_BYTES = 64 * 1024 * 1024
+
+RAW_ABR_COLUMNS = (
+    "abn",
+    "entity_name",
+    "entity_type",
+    "entity_status",
+    "address_line_1",
+    "address_line_2",
+    "suburb",
+    "postcode",
+    "state",
+    "country",
+    "start_date_raw",
+)
 
 
 def get_connection():
     return psycopg2.connect(**DB_CONFIG)
 
 
-def strip_ns(tag: str) -> str:
-    """Strip XML namespace: {ns}Tag -> Tag."""
-    if "}" in tag:
-        return tag.split("}", 1)[1]
-    return tag
+def first_text(elem, path: str) -> str | None:
+    """First non-empty (stripped) text among elements matching path."""
+    for match in elem.iterfind(path):
+        text = (match.text or "").strip()
+        if text:
+            return text
+    return None
 
 
 def parse_abr_entity(abr_elem) -> Dict:
@@ -73,67 +91,50 @@ def parse_abr_entity(abr_elem) -> Dict:
         "start_date_raw": None,
     }
 
-    # Prefer main "organisation" name if available,
-    # otherwise fall back to constructed person name.
-    main_name_candidate: str | None = None
-    person_given_names: List[str] = []
-    person_family_name: str | None = None
-
     # ABR element-level attributes
     record_updated = abr_elem.attrib.get("recordLastUpdatedDate")
     if record_updated and not rec["start_date_raw"]:
         rec["start_date_raw"] = record_updated
 
-    for child in abr_elem.iter():
-        tag = strip_ns(child.tag)
-        text = (child.text or "").strip()
-
-        # ---------- ABN ----------
-        if tag == "ABN":
-            if text and not rec["abn"]:
-                rec["abn"] = text
-            status = child.attrib.get("status")
-            if status and not rec["entity_status"]:
-                rec["entity_status"] = status
-            # ABNStatusFromDate is a good "start date" candidate
-            abn_from = child.attrib.get("ABNStatusFromDate")
-            if abn_from and not rec["start_date_raw"]:
-                rec["start_date_raw"] = abn_from
-
-        # ---------- Entity type ----------
-        elif tag == "EntityTypeText":
-            if text and not rec["entity_type"]:
-                rec["entity_type"] = text
-
-        # ---------- Organisation names ----------
-        elif tag == "NonIndividualNameText":
-            # e.g. FRESHWATER BAY PRIMARY SCHOOL, Gates Superannuation Fund,
-            # The Trustee for J A Sill Super Fund, etc.
-            if text and not main_name_candidate:
-                main_name_candidate = text
-
-        # ---------- Person names ----------
-        elif tag == "GivenName":
-            if text:
-                person_given_names.append(text)
-        elif tag == "FamilyName":
-            if text and not person_family_name:
-                person_family_name = text
-
-        # ---------- Address ----------
-        elif tag == "State":
-            if text and not rec["state"]:
-                rec["state"] = text
-        elif tag == "Postcode":
-            if text and not rec["postcode"]:
-                rec["postcode"] = text
-        # No explicit suburb in sample, so we leave rec["suburb"] as None
-
-        # ---------- GST-based dates (fallback) ----------
-        elif tag == "GST":
-            gst_from = child.attrib.get("GSTStatusFromDate")
-            if gst_from and not rec["start_date_raw"]:
-                rec["start_date_raw"] = gst_from
+    # ---------- ABN ----------
+    abn_elem = abr_elem.find("{*}ABN")
+    if abn_elem is not None:
+        rec["abn"] = (abn_elem.text or "").strip() or None
+        rec["entity_status"] = abn_elem.attrib.get("status") or None
+        # ABNStatusFromDate is a good "start date" candidate
+        abn_from = abn_elem.attrib.get("ABNStatusFromDate")
+        if abn_from and not rec["start_date_raw"]:
+            rec["start_date_raw"] = abn_from
+
+    # ---------- Entity type ----------
+    rec["entity_type"] = first_text(abr_elem, "{*}EntityType/{*}EntityTypeText")
+
+    # ---------- Organisation names ----------
+    # Prefer main "organisation" name if available,
+    # otherwise fall back to constructed person name.
+    # e.g. FRESHWATER BAY PRIMARY SCHOOL, Gates Superannuation Fund,
+    # The Trustee for J A Sill Super Fund, etc.
+    main_name_candidate = first_text(abr_elem, ".//{*}NonIndividualNameText")
+
+    # ---------- Person names ----------
+    person_given_names: List[str] = [
+        text
+        for text in ((e.text or "").strip() for e in abr_elem.iterfind(".//{*}GivenName"))
+        if text
+    ]
+    person_family_name = first_text(abr_elem, ".//{*}FamilyName")
+
+    # ---------- Address ----------
+    rec["state"] = first_text(abr_elem, ".//{*}State")
+    rec["postcode"] = first_text(abr_elem, ".//{*}Postcode")
+    # No explicit suburb in sample, so we leave rec["suburb"] as None
+
+    # ---------- GST-based dates (fallback) ----------
+    gst_elem = abr_elem.find("{*}GST")
+    if gst_elem is not None:
+        gst_from = gst_elem.attrib.get("GSTStatusFromDate")
+        if gst_from and not rec["start_date_raw"]:
+            rec["start_date_raw"] = gst_from
 
     # Decide on entity_name:
     if main_name_candidate:
@@ -158,15 +159,28 @@ def iter_abr_records_from_xml(xml_file):
     Stream over an ABR XML file and yield one dict per <ABR> record.
     """
     print("🔍 Streaming XML from zip member...")
-    context = iterparse(xml_file, events=("end",))
+    # {*} matches <ABR> in any namespace, so lxml only hands us finished records
+    context = etree.iterparse(xml_file, events=("end",), tag="{*}ABR")
     for event, elem in context:
-        tag = strip_ns(elem.tag)
-        if tag == "ABR":
-            rec = parse_abr_entity(elem)
-            # Enforce NOT NULL constraint on entity_name
-            if rec["abn"] and rec["entity_name"]:
-                yield rec
-            elem.clear()  # free memory
+        rec = parse_abr_entity(elem)
+        # Enforce NOT NULL constraint on entity_name
+        if rec["abn"] and rec["entity_name"]:
+            yield rec
+
+        # Free memory: clear this record and drop already-processed siblings
+        # so the root doesn't keep an empty element per record
+        elem.clear()
+        while elem.getprevious() is not None:
+            del elem.getparent()[0]
+    del context
+
+
+def copy_buffer(cur, copy_sql: str, buf: io.StringIO):
+    """Stream the CSV rows accumulated in buf into Postgres, then reset buf."""
+    buf.seek(0)
+    cur.copy_expert(copy_sql, buf)
+    buf.seek(0)
+    buf.truncate(0)
 
 
 def load_abr_bulk_into_db():
@@ -182,24 +196,14 @@ def load_abr_bulk_into_db():
         print("🧹 Truncating raw_abr before bulk load (idempotent demo)...")
         cur.execute("TRUNCATE TABLE raw_abr;")
 
-        insert_sql = """
-            INSERT INTO raw_abr (
-                abn,
-                entity_name,
-                entity_type,
-                entity_status,
-                address_line_1,
-                address_line_2,
-                suburb,
-                postcode,
-                state,
-                country,
-                start_date_raw
-            )
-            VALUES %s
-        """
-
-        batch: List[tuple] = []
+        copy_sql = f"COPY raw_abr ({', '.join(RAW_ABR_COLUMNS)}) FROM STDIN WITH (FORMAT CSV)"
+
+        # Rows are CSV-encoded into an in-memory buffer and streamed with COPY
+        # whenever it grows past COPY_BUFFER_BYTES; None is written as an
+        # unquoted empty field, which COPY reads back as NULL.
+        buf = io.StringIO()
+        writer = csv.writer(buf)
+        buffered = 0
         total = 0
 
         for zip_path in zip_files:
@@ -211,32 +215,18 @@ def load_abr_bulk_into_db():
                     print(f"  📄 XML file: {member}")
                     with zf.open(member) as xml_file:
                         for rec in iter_abr_records_from_xml(xml_file):
-                            batch.append(
-                                (
-                                    rec["abn"],
-                                    rec["entity_name"],
-                                    rec["entity_type"],
-                                    rec["entity_status"],
-                                    rec["address_line_1"],
-                                    rec["address_line_2"],
-                                    rec["suburb"],
-                                    rec["postcode"],
-                                    rec["state"],
-                                    rec["country"],
-                                    rec["start_date_raw"],
-                                )
-                            )
-
-                            if len(batch) >= BATCH_SIZE:
-                                execute_values(cur, insert_sql, batch)
-                                total += len(batch)
+                            writer.writerow([rec[col] for col in RAW_ABR_COLUMNS])
+                            buffered += 1
+
+                            if buf.tell() >= COPY_BUFFER_BYTES:
+                                copy_buffer(cur, copy_sql, buf)
+                                total += buffered
+                                buffered = 0
                                 print(f"    ✅ Inserted {total} rows so far...")
-                                batch.clear()
 
-        if batch:
-            execute_values(cur, insert_sql, batch)
-            total += len(batch)
-            batch.clear()
+        if buffered:
+            copy_buffer(cur, copy_sql, buf)
+            total += buffered
 
         conn.commit()
         print(f"🎉 ABR bulk load complete. Total rows inserted: {total}")
@@ -1,3 +1,4 @@
+import os
 from pathlib import Path
 
 import pandas as pd
@@ -8,7 +9,7 @@ DB_CONFIG = {
     "dbname": "firmable_companies",
     "user": "firmable",
     "password": "firmable_password",
-    "host": "localhost",
+    "host": os.getenv("PGHOST", "localhost"),
     "port": 5432,
 }
 
@@ -26,19 +27,25 @@ def load_commoncrawl_csv(csv_path: Path, crawl_id: str = "CC-MAIN-2025-03"):
     df["domain"] = df["domain"].astype(str).str.lower().str.strip()
     df["tld"] = df["tld"].astype(str).str.lower().str.strip()
 
-    rows = []
-    for _, row in df.iterrows():
-        rows.append(
-            (
-                crawl_id,
-                row["url"],
-                row["domain"],
-                row.get("tld", None),
-                row.get("html_title", None),
-                row.get("extracted_name", None),
-                row.get("extracted_industry", None),
-            )
-        )
+    # Optional columns may be missing from the sample CSV
+    for col in ("html_title", "extracted_name", "extracted_industry"):
+        if col not in df.columns:
+            df[col] = None
+
+    df["crawl_id"] = crawl_id
+    rows = list(
+        df[
+            [
+                "crawl_id",
+                "url",
+                "domain",
+                "tld",
+                "html_title",
+                "extracted_name",
+                "extracted_industry",
+            ]
+        ].itertuples(index=False, name=None)
+    )
 
     print(f"✅ Prepared {len(rows)} rows for insertion into raw_commoncrawl")
     if not rows:
@@ -61,7 +68,8 @@ def load_commoncrawl_csv(csv_path: Path, crawl_id: str = "CC-MAIN-2025-03"):
         VALUES %s
     """
 
-    execute_values(cur, insert_sql, rows)
+    # Whole sample in one INSERT instead of execute_values' default 100-row pages
+    execute_values(cur, insert_sql, rows, page_size=len(rows))
     cur.close()
     conn.close()
     print("✅ Inserted Common Crawl sample into raw_commoncrawl.")
@@ -1,59 +1,130 @@
 from __future__ import annotations
 
 import gzip
+import io
 import json
+import os
+import queue
+import threading
+from collections import deque
+from contextlib import closing
+from itertools import chain, islice
+from multiprocessing import Pool
 from pathlib import Path
-from typing import List, Tuple
-from urllib.parse import urlparse
-from datetime import datetime
+from typing import Iterable, List, Tuple
+from urllib.request import urlopen
+from datetime import datetime, timezone
+from functools import lru_cache
 
 import psycopg2
-from psycopg2.extras import execute_values
+from psycopg2 import sql
+
+from copy_stream import COPY_NULL, CsvRowStream
+
+try:
+    import orjson
+
+    json_loads = orjson.loads
+except ImportError:
+    json_loads = json.loads
+
+try:
+    # Optional: python-isal's igzip is a drop-in GzipFile backed by ISA-L's
+    # SIMD inflate and is several times faster than stdlib zlib.
+    from isal import igzip as gzip_impl
+except ImportError:
+    gzip_impl = gzip
 
 DB_CONFIG = {
     "dbname": "firmable_companies",
     "user": "firmable",
     "password": "firmable_password",
-    "host": "localhost",
+    "host": os.getenv("PGHOST", "localhost"),
     "port": 5432,
 }
 
 DATA_DIR = Path(__file__).resolve().parent.parent / "data" / "commoncrawl"
 CDX_FILE = DATA_DIR / "cc-index-cdx-00000.gz"
 MAX_RECORDS = 100_000
-BATCH_SIZE = 2_000
 CRAWL_ID = "CC-MAIN-2025-13"
+# Set CC_STREAM_CDX=1 to read the shard over HTTPS instead of from CDX_FILE
+CC_STREAM_CDX = os.getenv("CC_STREAM_CDX", "0") == "1"
+CDX_URL = os.getenv(
+    "CC_CDX_URL",
+    f"https://data.commoncrawl.org/cc-index/collections/{CRAWL_ID}/indexes/cdx-00000.gz",
+)
+CDX_HTTP_TIMEOUT_SECONDS = 60
+CDX_READ_BUFFER_SIZE = 1 << 20
+HOST_CACHE_SIZE = 200_000
+# Opt-in: drop secondary indexes for the load and rebuild them afterwards.
+# Adds no locking (the TRUNCATE already holds ACCESS EXCLUSIVE until commit);
+# the cost is a full rebuild of each index at the end, which only beats
+# per-row maintenance on large loads.
+CC_DROP_INDEXES_DURING_LOAD = os.getenv("CC_DROP_INDEXES_DURING_LOAD", "0") == "1"
+CDX_LINE_BATCH = 5_000
+CDX_QUEUE_DEPTH = 8
+# Opt-in: parsing a line is now a byte scan plus a cache lookup, cheaper
+# than pickling it to a worker and the row back, so the default is in-process
+CC_PARSE_WORKERS = int(os.getenv("CC_PARSE_WORKERS", "1"))
+COPY_READ_SIZE = 64 * 1024
+
+RAW_COMMONCRAWL_COLUMNS = (
+    "crawl_id",
+    "url",
+    "domain",
+    "tld",
+    "html_title",
+    "company_name_raw",
+    "company_name_norm",
+    "industry",
+    "fetched_at",
+)
 
 
 def get_connection():
     return psycopg2.connect(**DB_CONFIG)
 
 
-def extract_host_and_tld(url: str) -> Tuple[str | None, str | None]:
+def extract_host(url: str) -> str | None:
     """
-    Parse host and a simple TLD from a URL using stdlib only.
+    Pull the lowercased host out of a URL.
+    Plain string slicing rather than urlparse: this runs once per CDX line
+    and we only ever need the host.
     """
-    try:
-        parsed = urlparse(url)
-        host = parsed.netloc.lower()
-        if not host:
-            return None, None
+    start = url.find("://")
+    if start < 0:
+        return None
+    start += 3
+
+    end = url.find("/", start)
+    host = url[start:end] if end >= 0 else url[start:]
+    for sep in ("?", "#"):
+        if sep in host:
+            host = host[:host.index(sep)]
+
+    # Drop userinfo and port; keep bracketed IPv6 literals intact
+    if "@" in host:
+        host = host.rpartition("@")[2]
+    if host.startswith("["):
+        host = host[:host.find("]") + 1]
+    else:
+        host = host.partition(":")[0]
 
-        # Strip port if present
-        if ":" in host:
-            host = host.split(":", 1)[0]
+    return host.lower() or None
 
-        parts = host.split(".")
-        if len(parts) >= 3 and parts[-1] == "au":
-            tld = ".".join(parts[-2:])  # e.g. com.au, org.au
-        elif len(parts) >= 2:
-            tld = ".".join(parts[-2:])
-        else:
-            tld = parts[0]
 
-        return host, tld
-    except Exception:
-        return None, None
+def host_tld(host: str) -> str:
+    """
+    Simple TLD: the last two labels of the host (e.g. com.au, example.com).
+    """
+    last_dot = host.rfind(".")
+    return host[host.rfind(".", 0, last_dot) + 1:] if last_dot >= 0 else host
+
+
+# bytes.translate tables: uppercase a-z, and delete every non-alphanumeric
+# ASCII byte, in one C-level pass over the label
+ASCII_UPPER = bytes.maketrans(b"abcdefghijklmnopqrstuvwxyz", b"ABCDEFGHIJKLMNOPQRSTUVWXYZ")
+ASCII_NON_ALNUM = bytes(i for i in range(128) if not chr(i).isalnum())
 
 
 def derive_company_name_from_domain(domain: str) -> str | None:
@@ -69,81 +140,246 @@ def derive_company_name_from_domain(domain: str) -> str | None:
         if clean.startswith(prefix):
             clean = clean[len(prefix):]
 
-    parts = clean.split(".")
-    if len(parts) > 1:
-        label = parts[0]
+    label = clean.partition(".")[0]
+    if label.isascii():
+        name = label.encode("ascii").translate(ASCII_UPPER, ASCII_NON_ALNUM).decode("ascii")
     else:
-        label = clean
-
-    name = "".join(ch for ch in label if ch.isalnum())
-    if not name:
-        return None
-    return name.upper()
+        name = "".join(ch for ch in label if ch.isalnum()).upper()
+    return name or None
 
 
 def normalize_name(name: str | None) -> str | None:
     if not name:
         return None
+    # Domain-derived names are already a single uppercase alnum token
+    if name.isalnum() and name.isupper():
+        return name
     return " ".join(name.upper().split())
 
 
-def stream_cdx_records():
+@lru_cache(maxsize=HOST_CACHE_SIZE)
+def host_derived_fields(host: str) -> Tuple[str, str | None, str | None]:
+    """
+    (tld, company_name_raw, company_name_norm) for a host. These depend only
+    on the host, and a CDX shard repeats each host across many URLs, so
+    caching turns the per-URL work into per-host work.
+    """
+    company_name_raw = derive_company_name_from_domain(host)
+    return host_tld(host), company_name_raw, normalize_name(company_name_raw)
+
+
+def _put_unless_stopped(batches: queue.Queue, item, stop: threading.Event) -> None:
+    while not stop.is_set():
+        try:
+            batches.put(item, timeout=0.5)
+            return
+        except queue.Full:
+            continue
+
+
+def open_cdx_source():
+    """
+    Binary stream of the gzipped CDX shard: the local copy under DATA_DIR,
+    or with CC_STREAM_CDX=1 the shard read straight off data.commoncrawl.org,
+    so nothing is written to disk and the download stops once MAX_RECORDS
+    rows have been read.
+    """
+    if CC_STREAM_CDX:
+        return io.BufferedReader(
+            urlopen(CDX_URL, timeout=CDX_HTTP_TIMEOUT_SECONDS), buffer_size=CDX_READ_BUFFER_SIZE
+        )
+    return open(CDX_FILE, "rb", buffering=CDX_READ_BUFFER_SIZE)
+
+
+def _read_cdx_line_batches(batches: queue.Queue, stop: threading.Event) -> None:
+    """
+    Reader thread: inflate the CDX shard, handing raw byte lines to the
+    consumer in lists of CDX_LINE_BATCH. Ends with None; a read error is
+    passed through the queue so the consumer can re-raise it.
+    """
+    try:
+        # Large buffers on both the compressed file and the inflated stream keep
+        # reads/decompression in big chunks instead of the 8 KiB defaults.
+        # Lines stay as bytes: the JSON parser takes bytes directly.
+        with open_cdx_source() as raw, io.BufferedReader(
+            gzip_impl.GzipFile(fileobj=raw, mode="rb"), buffer_size=CDX_READ_BUFFER_SIZE
+        ) as f:
+            while not stop.is_set():
+                batch = list(islice(f, CDX_LINE_BATCH))
+                if not batch:
+                    break
+                _put_unless_stopped(batches, batch, stop)
+    except Exception as e:
+        _put_unless_stopped(batches, e, stop)
+    finally:
+        _put_unless_stopped(batches, None, stop)
+
+
+def iter_cdx_line_batches():
+    """
+    Yield batches of CDX lines read by a background thread, so gunzip runs
+    (mostly outside the GIL) while this thread parses rows and feeds COPY.
+    The queue is bounded at CDX_QUEUE_DEPTH batches to cap memory.
+    """
+    batches: queue.Queue = queue.Queue(maxsize=CDX_QUEUE_DEPTH)
+    stop = threading.Event()
+    reader = threading.Thread(
+        target=_read_cdx_line_batches, args=(batches, stop), name="cdx-reader", daemon=True
+    )
+    reader.start()
+
+    try:
+        while True:
+            item = batches.get()
+            if item is None:
+                return
+            if isinstance(item, Exception):
+                raise item
+            yield item
+    finally:
+        stop.set()
+        reader.join()
+
+
+def extract_cdx_url(meta_json: bytes) -> str | None:
     """
-    Stream the CDX file and yield up to MAX_RECORDS records.
+    Pull "url" out of a CDX line's JSON block by scanning for the key rather
+    than parsing every field. Falls back to a full parse when the key isn't
+    found in the expected form or the value contains escapes.
+    """
+    key = meta_json.find(b'"url":')
+    if key >= 0:
+        start = key + 6
+        while meta_json[start:start + 1] == b" ":
+            start += 1
+        if meta_json[start:start + 1] == b'"':
+            end = meta_json.find(b'"', start + 1)
+            value = meta_json[start + 1:end]
+            if end >= 0 and b"\\" not in value:
+                try:
+                    return value.decode("utf-8")
+                except UnicodeDecodeError:
+                    # Same outcome as the full parse, which rejects the line
+                    return None
+
+    try:
+        url = json_loads(meta_json).get("url")
+    except Exception:
+        return None
+    return url if isinstance(url, str) else None
+
+
+_fetched_at: datetime | None = None
+
+
+def init_cdx_worker(fetched_at: datetime):
+    """
+    Pool initializer: every worker stamps its rows with the scan's single
+    fetched_at timestamp.
+    """
+    global _fetched_at
+    _fetched_at = fetched_at
+
+
+def parse_cdx_lines(lines: List[bytes]) -> Tuple[List[tuple], int]:
+    """
+    Turn a batch of raw CDX lines into raw_commoncrawl rows (tuples in
+    RAW_COMMONCRAWL_COLUMNS order). Also returns how many of them are .au.
+    """
+    rows = []
+    count_au = 0
+    for line in lines:
+        line = line.strip()
+        if not line:
+            continue
+
+        parts = line.split(b" ", 2)
+        if len(parts) < 3:
+            continue
+
+        url = extract_cdx_url(parts[2])
+        if not url:
+            continue
+
+        host = extract_host(url)
+        if not host:
+            continue
+
+        if host.endswith(".au"):
+            count_au += 1
+
+        tld, company_name_raw, company_name_norm = host_derived_fields(host)
+
+        rows.append((
+            CRAWL_ID,
+            url,
+            host,
+            tld,
+            None,  # html_title
+            company_name_raw,
+            company_name_norm,
+            None,  # industry
+            _fetched_at,
+        ))
+    return rows, count_au
+
+
+def iter_parsed_batches(batches: Iterable[List[bytes]], fetched_at: datetime):
+    """
+    Yield parse_cdx_lines results in file order. With CC_PARSE_WORKERS > 1,
+    batches are parsed in a process pool; only a couple of batches per
+    worker are in flight at a time, so the reader's bounded queue still
+    applies back-pressure and an early stop doesn't parse the whole shard.
+    """
+    if CC_PARSE_WORKERS <= 1:
+        init_cdx_worker(fetched_at)
+        for batch in batches:
+            yield parse_cdx_lines(batch)
+        return
+
+    # The pool is forked before `batches` is first pulled, i.e. before the
+    # reader thread starts
+    with Pool(
+        processes=CC_PARSE_WORKERS,
+        initializer=init_cdx_worker,
+        initargs=(fetched_at,),
+    ) as pool:
+        pending = deque()
+        for batch in batches:
+            pending.append(pool.apply_async(parse_cdx_lines, (batch,)))
+            if len(pending) >= 2 * CC_PARSE_WORKERS:
+                yield pending.popleft().get()
+        while pending:
+            yield pending.popleft().get()
+
+
+def stream_cdx_row_batches():
+    """
+    Stream the CDX file and yield up to MAX_RECORDS raw_commoncrawl rows,
+    a batch (list of tuples in RAW_COMMONCRAWL_COLUMNS order) at a time.
     We *prefer* .au domains, but we don't hard-filter on them because
     some shards (like the one we're using) may have 0 .au URLs.
     We still count how many .au hosts we saw for stats.
     """
-    if not CDX_FILE.exists():
+    if not CC_STREAM_CDX and not CDX_FILE.exists():
         raise FileNotFoundError(f"CDX file not found: {CDX_FILE}")
 
     count_yielded = 0
     count_seen_au = 0
+    # One timestamp for the whole scan; timezone-aware so TIMESTAMPTZ doesn't
+    # reinterpret it in the session time zone.
+    fetched_at = datetime.now(timezone.utc)
+
+    with closing(iter_cdx_line_batches()) as batches:
+        for rows, count_au in iter_parsed_batches(batches, fetched_at):
+            remaining = MAX_RECORDS - count_yielded
+            if len(rows) > remaining:
+                rows = rows[:remaining]
+                count_au = sum(1 for row in rows if row[2].endswith(".au"))
 
-    with gzip.open(CDX_FILE, "rt", encoding="utf-8", errors="ignore") as f:
-        for line in f:
-            line = line.strip()
-            if not line:
-                continue
-
-            parts = line.split(" ", 2)
-            if len(parts) < 3:
-                continue
-
-            _, _, json_str = parts
-            try:
-                meta = json.loads(json_str)
-            except Exception:
-                continue
-
-            url = meta.get("url")
-            if not url:
-                continue
-
-            host, tld = extract_host_and_tld(url)
-            if not host or not tld:
-                continue
-
-            if host.endswith(".au"):
-                count_seen_au += 1
-
-            company_name_raw = derive_company_name_from_domain(host)
-            company_name_norm = normalize_name(company_name_raw)
-
-            record = {
-                "crawl_id": CRAWL_ID,
-                "url": url,
-                "domain": host,
-                "tld": tld,
-                "html_title": None,
-                "company_name_raw": company_name_raw,
-                "company_name_norm": company_name_norm,
-                "industry": None,
-                "fetched_at": datetime.utcnow(),
-            }
-
-            yield record
-            count_yielded += 1
+            yield rows
+            count_yielded += len(rows)
+            count_seen_au += count_au
 
             if count_yielded >= MAX_RECORDS:
                 break
@@ -151,59 +387,67 @@ def stream_cdx_records():
     print(f"🔍 CDX scan complete. .au URLs seen: {count_seen_au}, yielded: {count_yielded}")
 
 
+def drop_secondary_indexes(cur, table: str) -> List[Tuple[str, str]]:
+    """
+    Drop the indexes on `table` that don't back a constraint (PK/unique) and
+    return their (name, indexdef) so they can be recreated after the load.
+    Runs inside the caller's transaction, so a failed load restores them.
+    """
+    cur.execute(
+        """
+        SELECT i.schemaname, i.indexname, i.indexdef
+        FROM pg_indexes i
+        WHERE i.schemaname = current_schema()
+          AND i.tablename = %s
+          AND NOT EXISTS (
+              SELECT 1
+              FROM pg_constraint c
+              WHERE c.conindid = format('%%I.%%I', i.schemaname, i.indexname)::regclass
+          )
+        """,
+        (table,),
+    )
+    indexes = cur.fetchall()
+    for schema, name, _ in indexes:
+        cur.execute(sql.SQL("DROP INDEX {}.{}").format(sql.Identifier(schema), sql.Identifier(name)))
+    return [(name, indexdef) for _, name, indexdef in indexes]
+
+
 def load_commoncrawl_into_db():
     conn = get_connection()
     conn.autocommit = False
     cur = conn.cursor()
 
     try:
-        print("Using CC index file:", CDX_FILE)
+        print("Using CC index file:", CDX_URL if CC_STREAM_CDX else CDX_FILE)
+        # The table is rebuilt from scratch on every run, so there's nothing to
+        # lose by not waiting for the WAL flush on commit.
+        cur.execute("SET LOCAL synchronous_commit = off;")
+
+        dropped_indexes = []
+        if CC_DROP_INDEXES_DURING_LOAD:
+            dropped_indexes = drop_secondary_indexes(cur, "raw_commoncrawl")
+            print(f"🔧 Dropped {len(dropped_indexes)} raw_commoncrawl indexes for the load")
+
         print("🧹 Truncating raw_commoncrawl before load (idempotent demo)...")
         cur.execute("TRUNCATE TABLE raw_commoncrawl;")
 
-        insert_sql = """
-            INSERT INTO raw_commoncrawl (
-                crawl_id,
-                url,
-                domain,
-                tld,
-                html_title,
-                company_name_raw,
-                company_name_norm,
-                industry,
-                fetched_at
-            )
-            VALUES %s
-        """
-
-        batch: List[tuple] = []
-        total = 0
-
-        for rec in stream_cdx_records():
-            batch.append(
-                (
-                    rec["crawl_id"],
-                    rec["url"],
-                    rec["domain"],
-                    rec["tld"],
-                    rec["html_title"],
-                    rec["company_name_raw"],
-                    rec["company_name_norm"],
-                    rec["industry"],
-                    rec["fetched_at"],
-                )
-            )
-
-            if len(batch) >= BATCH_SIZE:
-                execute_values(cur, insert_sql, batch)
-                total += len(batch)
-                print(f"    ✅ Inserted {total} rows so far...")
-                batch.clear()
-
-        if batch:
-            execute_values(cur, insert_sql, batch)
-            total += len(batch)
-            batch.clear()
+        # Plain COPY is enough while the table is truncated first. If this ever
+        # needs ON CONFLICT handling, COPY into a temp table and upsert from it
+        # (as extract_abr.insert_rows does) rather than going back to INSERTs.
+        columns = ", ".join(RAW_COMMONCRAWL_COLUMNS)
+        stream = CsvRowStream(chain.from_iterable(stream_cdx_row_batches()))
+        cur.copy_expert(
+            f"COPY raw_commoncrawl ({columns}) FROM STDIN WITH (FORMAT CSV, NULL '{COPY_NULL}')",
+            stream,
+            size=COPY_READ_SIZE,
+        )
+        total = stream.rows_written
+
+        if dropped_indexes:
+            print(f"🔧 Rebuilding {len(dropped_indexes)} raw_commoncrawl indexes...")
+            for _, indexdef in dropped_indexes:
+                cur.execute(indexdef)
 
         conn.commit()
         print(f"🎉 Common Crawl load complete. Total rows inserted: {total}")
@@ -1,3 +1,5 @@
+import os
+
 import psycopg2
 from pathlib import Path
 
@@ -9,7 +11,7 @@ def main():
         dbname="firmable_companies",
         user="firmable",
         password="firmable_password",
-        host="localhost",
+        host=os.getenv("PGHOST", "localhost"),
         port=5432,
     )
     conn.autocommit = True